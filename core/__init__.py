@@ -1,5 +1,13 @@
 # Core functionality package
-from .form_filler import FormFiller
-from .browser_manager import BrowserManager
 from .scheduler import Scheduler, next_wed_14_taipei, precise_sleep_until
 
+
+def __getattr__(name):
+    """Load Playwright-backed modules on first access, keeping interactive startup fast"""
+    if name == "FormFiller":
+        from .form_filler import FormFiller
+        return FormFiller
+    if name == "BrowserManager":
+        from .browser_manager import BrowserManager
+        return BrowserManager
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
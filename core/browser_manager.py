@@ -3,25 +3,64 @@ Browser management for form submission
 Handles browser creation, form filling with retry logic
 """
 import asyncio
-from typing import Tuple, Optional
+import json
+import os
+import tempfile
+from typing import Awaitable, Callable, Tuple, Optional, TypeVar
 from pathlib import Path
+from playwright.async_api import async_playwright
 
 from config.settings import (
-    HEADLESS, NAV_TIMEOUT_MS, ACTION_TIMEOUT_MS, 
-    MAX_RETRIES_PER_FORM, RETRY_BACKOFF_SECONDS, SCREENSHOT_DIR
+    HEADLESS, NAV_TIMEOUT_MS, ACTION_TIMEOUT_MS, MAX_CONCURRENT_FORMS,
+    MAX_RETRIES_PER_FORM, RETRY_BACKOFF_SECONDS, WEEKDAY_NAMES
 )
 from core.form_filler import FormFiller
-from utils.screenshot import take_screenshot, ensure_screenshot_dir, get_screenshot_filename
-from utils.validators import check_form_closed
+from utils.screenshot import take_screenshot
+from utils.validators import check_form_closed, FormClosedError, FormSubmitError
 from core.scheduler import precise_sleep_until
 
+T = TypeVar("T")
+
+# Delay before each attempt: none for the first, then the configured backoffs
+ATTEMPT_DELAYS = (0, *RETRY_BACKOFF_SECONDS)
+
+# Resources the form never needs to become interactive
+BLOCKED_RESOURCE_TYPES = frozenset({"image", "font", "media"})
+BLOCKED_URL_KEYWORDS = ("google-analytics.com", "googletagmanager.com", "doubleclick.net")
+
+# Cookies / localStorage carried over between runs to skip cold form bootstrap
+STORAGE_STATE_PATH = Path(".cache") / "storage_state.json"
+
+# Caps concurrently running forms, created lazily so it binds to the running event loop
+_form_slots: Optional[asyncio.Semaphore] = None
+
+
+def _get_form_slots() -> asyncio.Semaphore:
+    """Get the shared semaphore limiting concurrent forms"""
+    global _form_slots
+    if _form_slots is None:
+        _form_slots = asyncio.Semaphore(MAX_CONCURRENT_FORMS)
+    return _form_slots
+
+
+async def _block_heavy_resources(route) -> None:
+    """Abort image/font/media and analytics requests, let everything else through"""
+    request = route.request
+    if request.resource_type in BLOCKED_RESOURCE_TYPES or any(k in request.url for k in BLOCKED_URL_KEYWORDS):
+        await route.abort()
+    else:
+        await route.continue_()
+
 
 class BrowserManager:
     """Manages browser instances and form submission workflow"""
     
     @staticmethod
-    async def submit_single_form(context, url: str, weekday_name: str = "未知", weekday_idx: int = 0) -> Optional[str]:
-        """Submit single form (fill and submit immediately)"""
+    async def submit_single_form(context, url: str, weekday_name: str = "未知", weekday_idx: int = 0, capture_screenshot: bool = True) -> None:
+        """
+        Submit single form (fill and submit immediately), capture_screenshot=False skips the failure screenshot
+        Raises FormClosedError for a closed form, otherwise FormSubmitError carrying this attempt's screenshot_path
+        """
         page = await context.new_page()
         page.set_default_navigation_timeout(NAV_TIMEOUT_MS)
         page.set_default_timeout(ACTION_TIMEOUT_MS)
@@ -32,47 +71,48 @@ class BrowserManager:
         try:
             await filler.fill_form_only(url)
             await filler.submit_filled_form()
-            return None  # Success
             
         except Exception as e:
             print(f"錯誤: 星期{weekday_name}表單填寫失敗: {e}")
             
-            is_closed = await check_form_closed(page)
-            
-            try:
-                screenshot_path = await take_screenshot(page, weekday_idx)
-                print(f"已儲存失敗截圖: {screenshot_path}")
-            except Exception as screenshot_err:
-                print(f"截圖失敗: {screenshot_err}")
-            
-            if is_closed:
+            # A closed form always shows the same splash, so skip the screenshot
+            if await check_form_closed(page):
                 print(f"原因: 表單已關閉 (不接受回應)")
+                raise FormClosedError(f"星期{weekday_name}表單已關閉 (不接受回應)") from e
+            
+            if capture_screenshot:
+                try:
+                    screenshot_path = await take_screenshot(page, weekday_idx)
+                    print(f"已儲存失敗截圖: {screenshot_path}")
+                except Exception as screenshot_err:
+                    print(f"截圖失敗: {screenshot_err}")
             
-            raise
+            raise FormSubmitError(str(e), screenshot_path) from e
             
         finally:
             await page.close()
-            
-        return screenshot_path
 
     @staticmethod
     async def submit_form_with_retry(context, url: str, weekday_name: str = "未知", weekday_idx: int = 0) -> Tuple[bool, Optional[str], Optional[str]]:
         """Retry form submission with failure notification"""
-        from notifications.email_service import EmailService
+        from notifications.email_service import get_email_service
         
-        email_service = EmailService()
+        email_service = get_email_service()
         last_err: Optional[Exception] = None
         first_screenshot_path: Optional[str] = None
         first_failure_notified = False
         
-        for attempt, delay in enumerate([0] + RETRY_BACKOFF_SECONDS, start=1):
+        for attempt, delay in enumerate(ATTEMPT_DELAYS, start=1):
             if delay > 0:
                 print(f"等待 {delay} 秒後重試...")
                 await asyncio.sleep(delay)
             
             try:
                 print(f"嘗試第 {attempt} 次（共 {MAX_RETRIES_PER_FORM} 次）")
-                result = await BrowserManager.submit_single_form(context, url, weekday_name, weekday_idx)
+                # Only the first failure is reported with a screenshot, later attempts skip it
+                await BrowserManager.submit_single_form(
+                    context, url, weekday_name, weekday_idx, capture_screenshot=(attempt == 1)
+                )
                 return (True, None, None)
                 
             except Exception as e:
@@ -80,12 +120,10 @@ class BrowserManager:
                 print(f"第 {attempt} 次失敗：{e}")
                 
                 if attempt == 1 and not first_failure_notified:
-                    ensure_screenshot_dir()
-                    screenshot_filename = get_screenshot_filename(weekday_idx)
-                    potential_screenshot_path = Path(SCREENSHOT_DIR) / screenshot_filename
-                    
-                    if potential_screenshot_path.exists():
-                        first_screenshot_path = str(potential_screenshot_path)
+                    # Only the screenshot this attempt actually wrote, never a stale file from an earlier run
+                    if isinstance(e, FormSubmitError):
+                        first_screenshot_path = e.screenshot_path
+                    if first_screenshot_path:
                         print(f"找到第一次失敗的截圖：{first_screenshot_path}")
                     
                     try:
@@ -93,37 +131,100 @@ class BrowserManager:
                             weekday_name=weekday_name,
                             url=url,
                             screenshot_path=first_screenshot_path,
-                            error_msg=str(e)
+                            error_msg=str(e),
+                            will_retry=not isinstance(e, FormClosedError)
                         )
                         first_failure_notified = True
                         print(f"已發送第一次失敗通知郵件（星期{weekday_name}）")
                     except Exception as mail_err:
                         print(f"發送失敗通知郵件時出錯：{mail_err}")
+                
+                # A closed form will not reopen on retry, stop here
+                if isinstance(e, FormClosedError):
+                    print(f"星期{weekday_name}表單已關閉，不再重試")
+                    break
         
         return (False, first_screenshot_path, str(last_err))
 
     @staticmethod
-    async def run_in_isolated_browser(p, url: str, weekday_idx: int) -> Tuple[int, bool, Optional[str], Optional[str]]:
-        """Run form submission in isolated browser"""
-        weekday_name = "一二三四五六日"[weekday_idx]
-        browser = await p.chromium.launch(headless=HEADLESS)
-        context = await browser.new_context()
-        
+    async def launch_browser(p):
+        """Launch the single browser shared by all weekday forms in this run"""
+        return await p.chromium.launch(headless=HEADLESS)
+
+    @staticmethod
+    async def run_with_shared_browser(job: Callable[..., Awaitable[T]]) -> T:
+        """
+        Start ONE Playwright driver, ONE browser and ONE context for the process, run job(context), then shut all down
+        All weekday tasks must be gathered inside job; each opens its own page in this context
+        (the forms need no sign-in, so per-form cookie isolation is not required)
+        """
+        async with async_playwright() as p:
+            browser = await BrowserManager.launch_browser(p)
+            try:
+                context = await BrowserManager.new_context(browser)
+                try:
+                    return await job(context)
+                finally:
+                    await BrowserManager.close_context(context)
+            finally:
+                await browser.close()
+
+    @staticmethod
+    async def new_context(browser):
+        """Create the context shared by all forms, skipping resources irrelevant to form filling"""
+        storage_state = str(STORAGE_STATE_PATH) if STORAGE_STATE_PATH.exists() else None
+        try:
+            context = await browser.new_context(storage_state=storage_state)
+        except Exception as e:
+            if storage_state is None:
+                raise
+            # A corrupt state file must not block every later run: drop it and start clean
+            print(f"瀏覽器狀態檔無法載入，已忽略並刪除: {e}")
+            STORAGE_STATE_PATH.unlink(missing_ok=True)
+            context = await browser.new_context()
+        await context.route("**/*", _block_heavy_resources)
+        return context
+
+    @staticmethod
+    async def close_context(context) -> None:
+        """Persist storage state for the next run, then close the context"""
         try:
+            state = await context.storage_state()
+            STORAGE_STATE_PATH.parent.mkdir(parents=True, exist_ok=True)
+            # Write a sibling temp file and swap it in, so an interrupted run never leaves a truncated state file
+            fd, tmp_path = tempfile.mkstemp(dir=STORAGE_STATE_PATH.parent, prefix=".storage_state.", suffix=".json")
+            try:
+                with os.fdopen(fd, "w", encoding="utf-8") as f:
+                    json.dump(state, f)
+                os.replace(tmp_path, STORAGE_STATE_PATH)
+            except BaseException:
+                Path(tmp_path).unlink(missing_ok=True)
+                raise
+        except Exception as e:
+            print(f"儲存瀏覽器狀態失敗: {e}")
+        await context.close()
+
+    @staticmethod
+    async def run_in_shared_context(context, url: str, weekday_idx: int) -> Tuple[int, bool, Optional[str], Optional[str]]:
+        """
+        Run form submission on a new page of the shared context (from run_with_shared_browser)
+        At most MAX_CONCURRENT_FORMS run at once so pages do not compete for CPU/network
+        """
+        weekday_name = WEEKDAY_NAMES[weekday_idx]
+        
+        async with _get_form_slots():
             success, screenshot_path, error_msg = await BrowserManager.submit_form_with_retry(
                 context, url, weekday_name, weekday_idx
             )
             return (weekday_idx, success, screenshot_path, error_msg)
-        finally:
-            await context.close()
-            await browser.close()
 
     @staticmethod
-    async def prefill_and_submit_at_exact_time(p, url: str, weekday_idx: int, submit_time) -> Tuple[int, bool, Optional[str], Optional[str]]:
-        """Pre-fill form then submit at exact time (for Wednesday mode)"""
-        weekday_name = "一二三四五六日"[weekday_idx]
-        browser = await p.chromium.launch(headless=HEADLESS)
-        context = await browser.new_context()
+    async def prefill_and_submit_at_exact_time(context, url: str, weekday_idx: int, submit_time, prefill_time=None) -> Tuple[int, bool, Optional[str], Optional[str]]:
+        """
+        Pre-fill form then submit at exact time (for Wednesday mode), context must be the shared one
+        If prefill_time is given, the page is created first and filling starts at prefill_time
+        """
+        weekday_name = WEEKDAY_NAMES[weekday_idx]
         page = await context.new_page()
         page.set_default_navigation_timeout(NAV_TIMEOUT_MS)
         page.set_default_timeout(ACTION_TIMEOUT_MS)
@@ -134,6 +235,9 @@ class BrowserManager:
         filler = FormFiller(page, weekday_name)
         
         try:
+            if prefill_time is not None:
+                await precise_sleep_until(prefill_time)
+            
             print(f"[星期{weekday_name}] 開始填寫表單...")
             await filler.fill_form_only(url)
             print(f"[星期{weekday_name}] 表單已填寫完畢，等待送出時間...")
@@ -150,15 +254,17 @@ class BrowserManager:
             error_msg = str(e)
             print(f"[星期{weekday_name}] ✗ 表單處理失敗: {error_msg}")
             
-            try:
-                screenshot_path = await take_screenshot(page, weekday_idx)
-            except Exception as screenshot_err:
-                print(f"[星期{weekday_name}] 截圖失敗: {screenshot_err}")
+            if await check_form_closed(page):
+                error_msg = f"星期{weekday_name}表單已關閉 (不接受回應)"
+                print(f"[星期{weekday_name}] 原因: 表單已關閉 (不接受回應)")
+            else:
+                try:
+                    screenshot_path = await take_screenshot(page, weekday_idx)
+                except Exception as screenshot_err:
+                    print(f"[星期{weekday_name}] 截圖失敗: {screenshot_err}")
         
         finally:
             await page.close()
-            await context.close()
-            await browser.close()
         
         return (weekday_idx, success, screenshot_path, error_msg)
 
@@ -11,6 +11,117 @@ from config.settings import (
 )
 from utils.config_loader import get_config_loader
 
+# ==== Selector Candidates (tried in order) ====
+NAME_CANDIDATES = (
+    "input.whsOnd[aria-labelledby]",
+    "input.whsOnd",
+    "input[aria-label='姓名']",
+    "input[aria-labelledby*='姓名']",
+    "input[role='textbox']",
+    "div[role='textbox']",
+)
+
+VACATION_SELECTOR = "[role='radio'][aria-label='休假']"
+
+# Locate, scroll, click and read aria-checked in a single round-trip
+CLICK_VACATION_JS = """(sel) => {
+    const el = document.querySelector(sel);
+    if (!el) return null;
+    el.scrollIntoView({block: "center"});
+    el.click();
+    return el.getAttribute("aria-checked");
+}"""
+
+VACATION_CHECKED_JS = """(sel) => {
+    const el = document.querySelector(sel);
+    return !!el && el.getAttribute("aria-checked") === "true";
+}"""
+
+REASON_CANDIDATES = (
+    "textarea.KHxj8b.tL9Q4c",
+    "textarea[jsname='YPqjbf']",
+    "textarea[aria-label='您的回答']",
+    "textarea[required]",
+    "textarea",
+)
+
+SUBMIT_CANDIDATES = (
+    "div[role='button']:has-text('提交')",
+    "div[role='button']:has-text('送出')",
+    "div[role='button']:has-text('Submit')",
+    "div[role='button'] >> text=提交",
+    "div[role='button'] >> text=送出",
+    "div[role='button'] >> text=Submit",
+)
+
+SUBMIT_SPAN_SELECTOR = "span.NPEfkd.RveJvd.snByac:has-text('提交')"
+
+# Find and click the submit button with one DOM query, returns whether a button was clicked
+CLICK_SUBMIT_JS = """() => {
+    const buttons = [...document.querySelectorAll("div[role='button'], span.NPEfkd")];
+    const hit = buttons.find(b => /提交|送出|Submit/.test(b.textContent));
+    if (!hit) return false;
+    hit.click();
+    return true;
+}"""
+
+# Fill name, pick the vacation radio and fill the reason in a single round-trip;
+# each flag reports whether that step succeeded so the caller can fall back per step
+FILL_FORM_JS = """({name, reason, nameSelectors, vacationSelector, reasonSelectors}) => {
+    const setValue = (el, value) => {
+        el.focus();
+        el.value = value;
+        el.dispatchEvent(new Event("input", {bubbles: true}));
+        el.dispatchEvent(new Event("change", {bubbles: true}));
+        el.blur();
+    };
+    const result = {name_ok: false, vacation_ok: false, reason_ok: !reason};
+
+    for (const sel of nameSelectors) {
+        const el = document.querySelector(sel);
+        if (el && "value" in el) {
+            setValue(el, name);
+            result.name_ok = true;
+            break;
+        }
+    }
+
+    const radio = document.querySelector(vacationSelector);
+    if (radio) {
+        radio.scrollIntoView({block: "center"});
+        radio.click();
+        result.vacation_ok = radio.getAttribute("aria-checked") === "true";
+    }
+
+    if (reason) {
+        for (const sel of reasonSelectors) {
+            const all = document.querySelectorAll(sel);
+            if (all.length) {
+                setValue(all[all.length - 1], reason);
+                result.reason_ok = true;
+                break;
+            }
+        }
+    }
+    return result;
+}"""
+
+# ==== Precompiled Patterns ====
+REASON_LABEL_RE = re.compile(r"說明|原因|理由")
+
+
+def _is_submit_response(response) -> bool:
+    """Successful reply to the form's formResponse POST"""
+    return "formResponse" in response.url and response.status < 400
+
+
+def _union_locator(page, selectors):
+    """Combine candidate selectors into one locator, resolved by a single in-browser query"""
+    loc = page.locator(selectors[0])
+    for sel in selectors[1:]:
+        loc = loc.or_(page.locator(sel))
+    return loc
+
 
 class FormFiller:
     """Handles form filling operations"""
@@ -18,34 +129,43 @@ class FormFiller:
     def __init__(self, page, weekday_name: str = "未知"):
         self.page = page
         self.weekday_name = weekday_name
+        
+        # Locators are lazy, so building them up front costs no round-trips;
+        # each candidate list is one union locator so a miss costs one timeout, not one per selector
+        self._name_loc = _union_locator(page, NAME_CANDIDATES).first
+        self._vacation_loc = page.locator(VACATION_SELECTOR).first
+        self._reason_loc = _union_locator(page, REASON_CANDIDATES).last
+        self._submit_loc = _union_locator(page, SUBMIT_CANDIDATES).first
+        self._submit_span_loc = page.locator(SUBMIT_SPAN_SELECTOR).first
     
     async def ensure_form_ready(self) -> None:
-        """Wait for Google Form main body to load"""
-        await self.page.wait_for_selector("form", timeout=15_000)
-        await self.page.wait_for_selector(
-            "input.whsOnd, input[role='textbox'], div[role='textbox']", 
-            timeout=15_000
-        )
+        """Wait for Google Form main body to load (both waits run concurrently)"""
+        waits = {
+            asyncio.create_task(self.page.wait_for_selector("form", timeout=15_000)),
+            asyncio.create_task(self.page.wait_for_selector(
+                "input.whsOnd, input[role='textbox'], div[role='textbox']", 
+                timeout=15_000
+            )),
+        }
+        done, pending = await asyncio.wait(waits, return_when=asyncio.FIRST_EXCEPTION)
+        
+        # On failure, stop the other wait instead of leaving it running against a page about to close
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+        
+        for task in done:
+            task.result()  # Re-raise the first failure
     
     async def fill_name(self, name: str = NAME) -> None:
         """Fill name input using various DOM selector strategies"""
-        candidates = [
-            "input.whsOnd[aria-labelledby]",
-            "input.whsOnd",
-            "input[aria-label='姓名']",
-            "input[aria-labelledby*='姓名']",
-            "input[role='textbox']",
-            "div[role='textbox']",
-        ]
-
-        for sel in candidates:
-            try:
-                loc = self.page.locator(sel).first
-                await loc.click(timeout=8_000)
-                await loc.fill(name, timeout=8_000)
-                return
-            except Exception:
-                continue
+        try:
+            await self._name_loc.click(timeout=8_000)
+            await self._name_loc.fill(name, timeout=8_000)
+            return
+        except Exception:
+            pass
 
         # Text anchor method as fallback
         try:
@@ -58,14 +178,41 @@ class FormFiller:
 
         raise RuntimeError("找不到『姓名』輸入框")
     
+    async def _await_checked(self, locator, timeout_ms: int = 2_000) -> bool:
+        """Wait until the radio's aria-checked flips to true, returns False on timeout"""
+        handle = await locator.element_handle()
+        try:
+            await self.page.wait_for_function(
+                "el => el.getAttribute('aria-checked') === 'true'",
+                arg=handle,
+                timeout=timeout_ms
+            )
+            return True
+        except TimeoutError:
+            return False
+        finally:
+            await handle.dispose()
+    
     async def check_vacation(self) -> None:
         """Click vacation radio button"""
         # 統一使用標準策略來選取所有日期的 '休假' 選項
-        selector = "[role='radio'][aria-label='休假']"
+        # 快速策略: 單次 evaluate 完成定位、捲動、點擊與狀態讀取
+        try:
+            is_checked = await self.page.evaluate(CLICK_VACATION_JS, VACATION_SELECTOR)
+            if is_checked == "true":
+                return
+            if is_checked is not None:
+                # 已點擊但狀態尚未更新，等待 aria-checked 變為 true
+                await self.page.wait_for_function(
+                    VACATION_CHECKED_JS, arg=VACATION_SELECTOR, timeout=2_000
+                )
+                return
+        except Exception:
+            pass
         
         # 主要策略: 使用 aria-label 定位
         try:
-            locator = self.page.locator(selector).first
+            locator = self._vacation_loc
             await locator.wait_for(state="visible", timeout=8_000)
             await locator.scroll_into_view_if_needed(timeout=5_000)
             await locator.click(timeout=5_000)
@@ -77,22 +224,17 @@ class FormFiller:
             else:
                 # 如果第一次點擊無效，強制再次點擊
                 await locator.click(force=True, timeout=5_000)
-                await self.page.wait_for_timeout(500)
-                is_checked = await locator.get_attribute("aria-checked")
-                if is_checked == "true":
+                if await self._await_checked(locator):
                     return
         except Exception:
             pass
         
         # 備用策略: 使用 JavaScript 點擊
         try:
-            radio = self.page.locator(selector).first
+            radio = self._vacation_loc
             await radio.wait_for(state="attached", timeout=8_000)
             await radio.evaluate("element => element.click()")
-            await self.page.wait_for_timeout(500)
-            
-            is_checked = await radio.get_attribute("aria-checked")
-            if is_checked == "true":
+            if await self._await_checked(radio):
                 return
         except Exception:
             pass
@@ -117,27 +259,17 @@ class FormFiller:
         if not reason:
             return
         
-        candidates = [
-            "textarea.KHxj8b.tL9Q4c",
-            "textarea[jsname='YPqjbf']",
-            "textarea[aria-label='您的回答']",
-            "textarea[required]",
-            "textarea",
-        ]
-
-        for sel in candidates:
-            try:
-                loc = self.page.locator(sel).last
-                await loc.click(timeout=8_000)
-                await loc.fill(reason, timeout=8_000)
-                print(f"已填入原因: {reason}")
-                return
-            except Exception:
-                continue
+        try:
+            await self._reason_loc.click(timeout=8_000)
+            await self._reason_loc.fill(reason, timeout=8_000)
+            print(f"已填入原因: {reason}")
+            return
+        except Exception:
+            pass
 
         # If all selectors fail, try to find by text label
         try:
-            label = self.page.get_by_text(re.compile(r"說明|原因|理由"), exact=False)
+            label = self.page.get_by_text(REASON_LABEL_RE, exact=False)
             textarea_el = label.locator("xpath=..").locator("xpath=following::textarea[1]")
             await textarea_el.fill(reason, timeout=8_000)
             print(f"已填入原因: {reason}")
@@ -148,63 +280,67 @@ class FormFiller:
         print(f"警告: 找不到原因輸入欄位，但將繼續執行（原因: {reason}）")
     
     async def submit(self) -> None:
-        """Submit form and monitor redirect status"""
-        # Find and click submit button
-        btn_candidates = [
-            "div[role='button']:has-text('提交')",
-            "div[role='button']:has-text('送出')",
-            "div[role='button']:has-text('Submit')",
-            "div[role='button'] >> text=提交",
-            "div[role='button'] >> text=送出",
-            "div[role='button'] >> text=Submit",
-        ]
-
-        clicked = False
-        for sel in btn_candidates:
-            try:
-                await self.page.locator(sel).first.click(timeout=8_000)
-                clicked = True
-                break
-            except Exception:
-                continue
-
-        if not clicked:
+        """Submit form and monitor the formResponse reply"""
+        # Listen for the form POST response before clicking, so a fast reply cannot be missed;
+        # no Playwright deadline (timeout=0): both stages are timed from the successful click below
+        watcher = asyncio.create_task(self.page.wait_for_response(_is_submit_response, timeout=0))
+        
+        try:
+            # Find and click submit button
             try:
-                await self.page.locator("span.NPEfkd.RveJvd.snByac:has-text('提交')").first.click(timeout=8_000)
-                clicked = True
+                clicked = await self.page.evaluate(CLICK_SUBMIT_JS)
             except Exception:
-                pass
+                clicked = False
+        
+            # Locator fallback if the in-page search found nothing
+            if not clicked:
+                try:
+                    await self._submit_loc.click(timeout=8_000)
+                    clicked = True
+                except Exception:
+                    pass
 
-        if not clicked:
-            raise RuntimeError("找不到『提交/送出』按鈕")
+            if not clicked:
+                try:
+                    await self._submit_span_loc.click(timeout=8_000)
+                    clicked = True
+                except Exception:
+                    pass
 
-        # Stage 1: Wait for redirect (first 10 seconds)
-        try:
-            await self.page.wait_for_url(
-                re.compile(r"formResponse|/thankyou|/viewform\?edit2=.*"), 
-                timeout=SUBMIT_WARNING_TIMEOUT_SEC * 1000
-            )
+            if not clicked:
+                raise RuntimeError("找不到『提交/送出』按鈕")
+        except BaseException:
+            watcher.cancel()
+            raise
+        
+        # Stage 1: Redirect within the first 10 seconds after the click
+        done, _ = await asyncio.wait({watcher}, timeout=SUBMIT_WARNING_TIMEOUT_SEC)
+        if watcher in done:
+            watcher.result()
             return
-        except TimeoutError:
-            print(f"警告: 星期{self.weekday_name}表單在10秒內未轉跳, 發送警告郵件...")
-            
-            try:
-                from notifications.email_service import EmailService
-                email_service = EmailService()
-                await email_service.send_warning(self.weekday_name)
-            except Exception as mail_err:
-                print(f"警告: 發送警告郵件失敗: {mail_err}")
         
-        # Stage 2: Give 10 seconds grace period (20 seconds total)
-        try:
-            await self.page.wait_for_url(
-                re.compile(r"formResponse|/thankyou|/viewform\?edit2=.*"), 
-                timeout=(SUBMIT_KILL_TIMEOUT_SEC - SUBMIT_WARNING_TIMEOUT_SEC) * 1000
-            )
+        # Stage 2: Send warning email in the background while the watcher keeps running (20 seconds total)
+        print(f"警告: 星期{self.weekday_name}表單在10秒內未轉跳, 發送警告郵件...")
+        from notifications.email_service import get_email_service
+        get_email_service().start_background(self._send_warning())
+        
+        done, _ = await asyncio.wait({watcher}, timeout=SUBMIT_KILL_TIMEOUT_SEC - SUBMIT_WARNING_TIMEOUT_SEC)
+        if watcher in done:
+            watcher.result()
             print(f"提示: 星期{self.weekday_name}表單在第11-20秒間成功轉跳 (回應較慢)")
             return
-        except TimeoutError:
-            raise RuntimeError(f"星期{self.weekday_name}表單提交失敗: 20秒內未轉跳到成功頁面")
+        
+        watcher.cancel()
+        raise RuntimeError(f"星期{self.weekday_name}表單提交失敗: 20秒內未轉跳到成功頁面")
+    
+    async def _send_warning(self) -> None:
+        """Send the slow-redirect warning email, never raises"""
+        try:
+            from notifications.email_service import get_email_service
+            email_service = get_email_service()
+            await email_service.send_warning(self.weekday_name)
+        except Exception as mail_err:
+            print(f"警告: 發送警告郵件失敗: {mail_err}")
     
     async def fill_form_only(self, url: str) -> None:
         """Fill the form without submitting (for pre-filling)"""
@@ -216,11 +352,29 @@ class FormFiller:
         reason_map = config_loader.get_reasons()
         reason = reason_map.get(self.weekday_name, "")
         
-        await asyncio.gather(
-            self.fill_name(),
-            self.check_vacation(),
-            self.fill_reason(reason)
-        )
+        try:
+            result = await self.page.evaluate(FILL_FORM_JS, {
+                "name": NAME,
+                "reason": reason,
+                "nameSelectors": list(NAME_CANDIDATES),
+                "vacationSelector": VACATION_SELECTOR,
+                "reasonSelectors": list(REASON_CANDIDATES),
+            })
+        except Exception as e:
+            print(f"提示: 批次填寫失敗，改用逐欄填寫: {e}")
+            result = {}
+        
+        if reason and result.get("reason_ok"):
+            print(f"已填入原因: {reason}")
+        
+        # Fall back to the Locator-based methods for any step the batch missed;
+        # awaited in order since they share one page and gather gives no real overlap
+        if not result.get("name_ok"):
+            await self.fill_name()
+        if not result.get("vacation_ok"):
+            await self.check_vacation()
+        if not result.get("reason_ok"):
+            await self.fill_reason(reason)
         print(f"已填寫完畢: 星期{self.weekday_name}表單（等待送出）")
     
     async def submit_filled_form(self) -> None:
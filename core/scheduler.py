@@ -2,10 +2,12 @@
 Time scheduling utilities for precise execution timing
 """
 import asyncio
+import time
 import datetime as dt
+from functools import lru_cache
 from typing import Optional
 
-from config.settings import TIMEZONE
+from config.settings import TIMEZONE, WEEKDAY_NAMES
 
 # Timezone utilities
 try:
@@ -15,8 +17,9 @@ except Exception:
     ZoneInfoNotFoundError = Exception
 
 
+@lru_cache(maxsize=1)
 def get_tz():
-    """Get timezone, prefer ZoneInfo('Asia/Taipei'), fallback to UTC+8 if tzdata is missing"""
+    """Get timezone (resolved once), prefer ZoneInfo('Asia/Taipei'), fallback to UTC+8 if tzdata is missing"""
     if ZoneInfo is None:
         return dt.timezone(dt.timedelta(hours=8))
     try:
@@ -41,35 +44,37 @@ def next_wed_14_taipei(now: Optional[dt.datetime] = None) -> dt.datetime:
     return target
 
 
+# Final window (seconds) handled by yielding to the loop instead of sleeping
+SPIN_WINDOW_SEC = 0.005
+# Longest single sleep, so wall-clock jumps (NTP, suspend) are re-checked periodically
+MAX_SLEEP_STEP_SEC = 300
+
+
 async def precise_sleep_until(target: dt.datetime) -> None:
     """
-    Precise sleep until target datetime using monotonic clock
-    First sleep to 60 seconds before, then 1 second granularity, finally millisecond convergence
+    Precise sleep until target datetime using the monotonic clock
+    One coarse sleep to just before the target, then yield-spin the last few milliseconds
     """
     tz = get_tz()
     assert target.tzinfo is not None, "target must be timezone-aware datetime"
 
-    def now_tz():
-        return dt.datetime.now(tz)
-
     while True:
-        now = now_tz()
-        delta = (target - now).total_seconds()
-        if delta <= 0:
-            return
-        if delta > 60:
-            await asyncio.sleep(min(delta - 60, 300))  # Max 5 minutes per step
-        elif delta > 1:
-            await asyncio.sleep(delta - 1)
-        else:
-            await asyncio.sleep(max(delta, 0.001))
+        delta = (target - dt.datetime.now(tz)).total_seconds()
+        if delta <= SPIN_WINDOW_SEC:
+            break
+        await asyncio.sleep(min(delta - SPIN_WINDOW_SEC, MAX_SLEEP_STEP_SEC))
+
+    # Integer nanosecond deadline for the final spin, no datetime math in the loop
+    deadline_ns = time.monotonic_ns() + int(max(delta, 0) * 1e9)
+    while time.monotonic_ns() < deadline_ns:
+        await asyncio.sleep(0)
 
 
 def validate_execution_time() -> None:
     """Display current time and check if it's Wednesday 14:00 (Taiwan time)"""
     tz = get_tz()
     now = dt.datetime.now(tz)
-    weekday_name = ["一", "二", "三", "四", "五", "六", "日"][now.weekday()]
+    weekday_name = WEEKDAY_NAMES[now.weekday()]
     print(f"目前時間 ({TIMEZONE}): {now:%Y-%m-%d %H:%M:%S}, 星期{weekday_name}")
     if now.weekday() != 2:
         print("提醒: 今天不是星期三")
@@ -4,9 +4,10 @@ Main entry point for the application
 """
 import sys
 import asyncio
+import logging
 import datetime as dt
-from typing import List, Tuple
-from playwright.async_api import async_playwright
+from dataclasses import dataclass
+from typing import Dict, List, Optional
 
 # Check Python version before importing other modules
 if sys.version_info < (3, 9):
@@ -16,17 +17,41 @@ if sys.version_info < (3, 9):
     print("Please upgrade your Python installation")
     sys.exit(1)
 
-from config.settings import WEEKDAY_MAP
+from config.settings import TIMEZONE, WEEKDAY_MAP, WEEKDAY_NAMES
 from utils.config_loader import get_config_loader
 from core.scheduler import Scheduler, get_tz
-from core.browser_manager import BrowserManager
-from notifications.email_service import EmailService
+from notifications.email_service import get_email_service
 
 
-def compute_target_indices_and_urls() -> Tuple[List[int], List[str]]:
+def install_uvloop() -> None:
+    """Use uvloop as the asyncio event loop on POSIX when it is installed (optional)"""
+    if sys.platform == "win32":
+        return
+    try:
+        import uvloop
+    except ImportError:
+        return
+    asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+
+
+def configure_logging() -> None:
+    """Send log records (email module) to stdout as plain lines, interleaved with the print output"""
+    logging.basicConfig(level=logging.INFO, format="%(message)s", stream=sys.stdout)
+
+
+@dataclass
+class PlanContext:
+    """Everything main needs for this run, built from a single config pass"""
+    indices: List[int]           # Target weekday indices (deduplicated and sorted)
+    urls: List[str]              # Form URLs (7 entries, Monday to Sunday)
+    weekday_list: List[str]      # Chinese weekday names of the targets
+    reason_map: Dict[str, str]   # Validated reason mapping
+
+
+def build_plan() -> Optional[PlanContext]:
     """
-    Load config.json and compute target weekday indices and URLs
-    Returns: (target_indices (deduplicated and sorted), form_urls (7 lines))
+    Load config.json, compute target weekdays and URLs, and validate reasons
+    Returns None when there is nothing to fill
     """
     config_loader = get_config_loader()
     
@@ -34,34 +59,38 @@ def compute_target_indices_and_urls() -> Tuple[List[int], List[str]]:
         requested_days = config_loader.get_weekdays()
     except Exception as e:
         print(f"錯誤：讀取配置失敗：{e}")
-        return [], []
+        return None
     
     if not requested_days:
         print("提示：config.json 中沒有設定要填寫的日期，程式結束。")
-        return [], []
+        return None
 
     try:
         form_urls = config_loader.get_form_urls()
     except Exception as e:
         print(f"錯誤：讀取表單 URL 失敗：{e}")
-        return [], []
+        return None
 
-    # Convert Chinese weekday to index
-    indices: List[int] = []
+    # Convert Chinese weekday to index (deduplicated via set)
     for token in requested_days:
         if token not in WEEKDAY_MAP:
             print(f"警告：無法辨識的星期：{token}，略過。")
-            continue
-        idx = WEEKDAY_MAP[token]
-        if idx not in indices:
-            indices.append(idx)
+    indices: List[int] = sorted({WEEKDAY_MAP[token] for token in requested_days if token in WEEKDAY_MAP})
 
-    indices.sort()
     if not indices:
         print("提示：沒有有效的星期可供填寫。")
-        return [], []
+        return None
+
+    # Validate reasons for the requested weekdays (exits on invalid config)
+    weekday_list = [WEEKDAY_NAMES[i] for i in indices]
+    config_loader.validate_reasons(weekday_list)
 
-    return indices, form_urls
+    return PlanContext(
+        indices=indices,
+        urls=form_urls,
+        weekday_list=weekday_list,
+        reason_map=config_loader.get_reasons(),
+    )
 
 
 async def main() -> None:
@@ -69,25 +98,33 @@ async def main() -> None:
     # Interactive schedule choice
     scheduler = Scheduler()
     mode, minutes = scheduler.prompt_choice()
+    # Playwright is imported only after the prompts, so questions appear immediately
+    from core.browser_manager import BrowserManager
     tz = get_tz()
+    tz_key = getattr(tz, "key", TIMEZONE)  # fixed-offset fallback has no key
 
-    # Compute target indices and URLs
-    target_indices, form_urls = compute_target_indices_and_urls()
-    if not target_indices:
+    # Build the run plan from config.json
+    plan = build_plan()
+    if plan is None:
         return
+    target_indices, form_urls = plan.indices, plan.urls
+    weekday_list, reason_map = plan.weekday_list, plan.reason_map
 
     # Display execution plan
-    weekday_str = "、".join("一二三四五六日"[i] for i in target_indices)
-    weekday_list = ["一二三四五六日"[i] for i in target_indices]
+    weekday_str = "、".join(weekday_list)
     print(f"預計要填的星期：{weekday_str}（共 {len(target_indices)} 個表單／瀏覽器）")
-
-    # Load and validate reason mapping from config.json
-    config_loader = get_config_loader()
-    config_loader.validate_reasons(weekday_list)
-    reason_map = config_loader.get_reasons()
     
     # Initialize email service
-    email_service = EmailService()
+    email_service = get_email_service()
+
+    async def send_reminder() -> None:
+        try:
+            await email_service.send_reminder(weekday_list, reason_map)
+            print("已發送執行前提醒郵件")
+        except Exception as mail_err:
+            print(f"發送提醒郵件失敗：{mail_err}")
+
+    reminder_task = None
 
     # Handle different execution modes
     if mode == "wed":
@@ -96,7 +133,7 @@ async def main() -> None:
         now = dt.datetime.now(tz)
         wait_seconds = (target - now).total_seconds()
         
-        print(f"將等待至（{tz.key if hasattr(tz, 'key') else 'Asia/Taipei'}）：{target:%Y-%m-%d %H:%M:%S}（週三 14:00）再執行...")
+        print(f"將等待至（{tz_key}）：{target:%Y-%m-%d %H:%M:%S}（週三 14:00）再執行...")
         print(f"表單將在 {prefill_time:%H:%M:%S} 開始填寫，{target:%H:%M:%S} 準時送出")
         
         # Send reminder email if wait time > 5 minutes
@@ -106,16 +143,11 @@ async def main() -> None:
             
             await scheduler.sleep_until(reminder_time)
             
-            try:
-                await email_service.send_reminder(weekday_list, reason_map)
-                print("已發送執行前提醒郵件")
-            except Exception as mail_err:
-                print(f"發送提醒郵件失敗：{mail_err}")
+            # Send in the background so a slow SMTP server cannot delay the prefill
+            reminder_task = asyncio.create_task(send_reminder())
             
-            print(f"等待到預填時間...")
-            await scheduler.sleep_until(prefill_time)
-        else:
-            await scheduler.sleep_until(prefill_time)
+        # Browser and pages are warmed up now; each task waits for prefill_time itself
+        print(f"預先啟動瀏覽器並開啟分頁，等待到預填時間 {prefill_time:%H:%M:%S}...")
             
     elif mode == "delay":
         start = dt.datetime.now(tz)
@@ -129,76 +161,84 @@ async def main() -> None:
     scheduler.validate_time()
 
     # Execute browser automation
-    results = []
+    success_list = []
+    failure_list = []
+    
+    # Every non-exception result comes from a task started for one of target_indices
+    weekday_url_map = {idx: form_urls[idx] for idx in target_indices}
+    
+    def record_result(result) -> None:
+        weekday_idx, success, screenshot_path, error_msg = result
+        weekday_name = WEEKDAY_NAMES[weekday_idx]
+        url = weekday_url_map[weekday_idx]
+        
+        if success:
+            success_list.append(weekday_name)
+            print(f"成功：星期{weekday_name}")
+        else:
+            failure_list.append((weekday_name, url, error_msg))
+            print(f"失敗：星期{weekday_name} - {error_msg}")
     
-    async with async_playwright() as p:
+    async def run_forms(context) -> None:
+        tasks = []
         # Special handling for Wednesday mode
         if mode == "wed":
-            print(f"\n=== 星期三模式：開始預填所有表單 ===")
+            print(f"\n=== 星期三模式：預先開啟所有表單分頁，{prefill_time:%H:%M:%S} 開始預填 ===")
             print(f"當前時間: {dt.datetime.now(tz):%H:%M:%S}")
             
-            tasks = []
             for idx in target_indices:
                 url = form_urls[idx]
-                weekday_name = "一二三四五六日"[idx]
-                print(f"[星期{weekday_name}] 準備開啟瀏覽器...")
+                weekday_name = WEEKDAY_NAMES[idx]
+                print(f"[星期{weekday_name}] 準備開啟瀏覽器分頁...")
                 tasks.append(asyncio.create_task(
-                    BrowserManager.prefill_and_submit_at_exact_time(p, url, idx, target)
+                    BrowserManager.prefill_and_submit_at_exact_time(
+                        context, url, idx, target, prefill_time=prefill_time
+                    )
                 ))
             
-            results = await asyncio.gather(*tasks, return_exceptions=True)
-            
         # Normal mode: fill and submit immediately
         else:
-            if len(target_indices) == 1:
-                idx = target_indices[0]
+            for idx in target_indices:
                 url = form_urls[idx]
-                print(f"\n=== 星期索引 {idx}（{'一二三四五六日'[idx]}） → 開 1 個瀏覽器 ===")
-                result = await BrowserManager.run_in_isolated_browser(p, url, idx)
-                results.append(result)
-            else:
-                tasks = []
-                for idx in target_indices:
-                    url = form_urls[idx]
-                    print(f"\n=== 星期索引 {idx}（{'一二三四五六日'[idx]}） → 開獨立瀏覽器 ===")
-                    tasks.append(asyncio.create_task(
-                        BrowserManager.run_in_isolated_browser(p, url, idx)
-                    ))
-
-                results = await asyncio.gather(*tasks, return_exceptions=True)
+                if len(target_indices) == 1:
+                    print(f"\n=== 星期索引 {idx}（{WEEKDAY_NAMES[idx]}） → 開 1 個瀏覽器分頁 ===")
+                else:
+                    print(f"\n=== 星期索引 {idx}（{WEEKDAY_NAMES[idx]}） → 開獨立分頁 ===")
+                tasks.append(asyncio.create_task(
+                    BrowserManager.run_in_shared_context(context, url, idx)
+                ))
+
+        # Report each form as soon as it finishes instead of waiting for the slowest one
+        for next_done in asyncio.as_completed(tasks):
+            try:
+                record_result(await next_done)
+            except Exception as e:
+                print(f"發生未預期錯誤：{e}")
+
+    # One Playwright driver, one browser and one context for the whole run
+    await BrowserManager.run_with_shared_browser(run_forms)
     
     # Record end time
     end_time = dt.datetime.now(tz)
     
-    # Process and display results
-    print("\n" + "=" * 50)
-    print("執行結果統計")
-    print("=" * 50)
-    
-    success_list = []
-    failure_list = []
-    
-    weekday_url_map = {idx: form_urls[idx] for idx in target_indices}
+    # Per-form results were printed as each task finished, close with the totals (one write)
+    report = [
+        "",
+        "=" * 50,
+        "執行結果統計",
+        "=" * 50,
+        "=" * 50,
+        f"總計：成功 {len(success_list)} 個，失敗 {len(failure_list)} 個",
+        "=" * 50,
+    ]
+    print("\n".join(report))
     
-    for result in results:
-        if isinstance(result, Exception):
-            print(f"發生未預期錯誤：{result}")
-            continue
-        
-        weekday_idx, success, screenshot_path, error_msg = result
-        weekday_name = "一二三四五六日"[weekday_idx]
-        url = weekday_url_map.get(weekday_idx, "未知")
-        
-        if success:
-            success_list.append(weekday_name)
-            print(f"成功：星期{weekday_name}")
-        else:
-            failure_list.append((weekday_name, url, error_msg))
-            print(f"失敗：星期{weekday_name} - {error_msg}")
+    # Make sure the reminder is out before the summary and SMTP shutdown
+    if reminder_task is not None:
+        await reminder_task
     
-    print("=" * 50)
-    print(f"總計：成功 {len(success_list)} 個，失敗 {len(failure_list)} 個")
-    print("=" * 50)
+    # Slow-redirect warnings are sent in the background, let them finish too
+    await email_service.wait_background()
     
     # Send summary email
     try:
@@ -210,8 +250,12 @@ async def main() -> None:
         )
     except Exception as mail_err:
         print(f"發送總結郵件失敗：{mail_err}")
+    finally:
+        await email_service.close()
 
 
 if __name__ == "__main__":
+    configure_logging()
+    install_uvloop()
     asyncio.run(main())
 
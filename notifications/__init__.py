@@ -1,3 +1,3 @@
 # Notifications package
-from .email_service import EmailService
+from .email_service import EmailService, get_email_service
 
@@ -3,15 +3,206 @@ Email notification service
 Handles all email sending operations
 """
 import os
+import asyncio
+import logging
 import datetime as dt
+from email.message import EmailMessage
 from pathlib import Path
-from typing import List, Tuple, Optional
+from typing import Awaitable, List, Optional, Set, Tuple
+
+# Optional until an email is actually sent, so the bot still runs with email disabled
+try:
+    import aiosmtplib
+except ImportError:
+    aiosmtplib = None
 
 from config.settings import (
     GMAIL_ACCOUNT, RECIPIENT_EMAIL, SENDER_NAME, MAIL_KEY_FILE,
     SMTP_SERVER, SMTP_PORT
 )
 
+logger = logging.getLogger(__name__)
+
+
+# Recycle a connection after this many messages, before the provider starts throttling it
+MAX_MESSAGES_PER_CONNECTION = 100
+
+
+class _SMTPSession:
+    """One persistent SMTP connection, pooled by _SMTPPool and shared by every EmailService in the process"""
+    
+    def __init__(self):
+        self._client = None
+        self._sent = 0  # Messages sent on the current connection
+        self._lock: Optional[asyncio.Lock] = None
+    
+    async def _connect(self, hostname: str, port: int, username: str, password: str) -> None:
+        if aiosmtplib is None:
+            raise ImportError("請先安裝 aiosmtplib：pip install aiosmtplib")
+        
+        # Port 465 speaks TLS from the first byte; anything else (e.g. 587) upgrades with STARTTLS
+        implicit_tls = port == 465
+        client = aiosmtplib.SMTP(hostname=hostname, port=port, use_tls=implicit_tls, start_tls=not implicit_tls)
+        await client.connect()
+        await client.login(username, password)
+        self._client = client
+        self._sent = 0
+    
+    def _get_lock(self) -> asyncio.Lock:
+        # Created lazily so it binds to the running loop
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        return self._lock
+    
+    async def send(self, message, hostname: str, port: int, username: str, password: str) -> None:
+        """Send message, connecting lazily, recycling after MAX_MESSAGES_PER_CONNECTION and reconnecting once if the server dropped us"""
+        async with self._get_lock():
+            if self._sent >= MAX_MESSAGES_PER_CONNECTION:
+                await self._disconnect()
+            if self._client is None or not self._client.is_connected:
+                await self._connect(hostname, port, username, password)
+            try:
+                await self._client.send_message(message)
+            except aiosmtplib.SMTPServerDisconnected:
+                await self._connect(hostname, port, username, password)
+                await self._client.send_message(message)
+            self._sent += 1
+    
+    async def close(self) -> None:
+        """Quit the connection if one is open, after any send in progress has finished"""
+        async with self._get_lock():
+            await self._disconnect()
+    
+    async def _disconnect(self) -> None:
+        """Quit the connection if one is open, caller must hold the lock"""
+        client, self._client = self._client, None
+        if client is not None and client.is_connected:
+            try:
+                await client.quit()
+            except Exception:
+                client.close()
+
+
+class _SMTPPool:
+    """Small pool of SMTP sessions so concurrent notifications do not queue behind one connection"""
+    
+    def __init__(self, size: int):
+        self._sessions = [_SMTPSession() for _ in range(size)]
+        self._idle: Optional[asyncio.LifoQueue] = None
+    
+    async def send(self, message, hostname: str, port: int, username: str, password: str) -> None:
+        """Send on an idle session, most recently used first so sequential sends keep reusing one connection"""
+        # Created lazily so it binds to the running loop
+        if self._idle is None:
+            self._idle = asyncio.LifoQueue()
+            for session in reversed(self._sessions):
+                self._idle.put_nowait(session)
+        
+        session = await self._idle.get()
+        try:
+            await session.send(message, hostname, port, username, password)
+        finally:
+            self._idle.put_nowait(session)
+    
+    async def close(self) -> None:
+        """Close every session in the pool"""
+        for session in self._sessions:
+            await session.close()
+
+
+# Keep well under Gmail's concurrent connection limit
+SMTP_POOL_SIZE = 3
+
+_smtp_pool = _SMTPPool(SMTP_POOL_SIZE)
+
+
+# ==== Email body templates (static skeletons, filled with format_map) ====
+WARNING_BODY = """表單填寫警告通知
+
+時間：{now}
+星期：{weekday}
+
+警告內容：
+星期{weekday}的表單在點擊提交後，10秒內未轉跳到成功頁面。
+程式將繼續等待至20秒，若仍未成功則會標記為失敗。
+
+可能原因：
+1. 網路速度較慢
+2. Google 伺服器回應延遲
+3. 表單設定有誤
+
+程式將繼續嘗試，請留意最終結果通知。
+
+----
+自動發送於表單提交後第10秒
+"""
+
+REMINDER_BODY = """劃假機器人提醒通知
+
+提醒時間：{now}
+
+本次將於下午兩點準時執行劃假作業。
+
+劃假星期：
+  {weekdays}
+{reason_section}
+程式將在 5 分鐘後自動執行。
+
+----
+本郵件由表單填寫機器人自動發送
+"""
+
+REMINDER_REASON_SECTION = """
+請假理由說明：
+{reason_lines}
+"""
+
+IMMEDIATE_FAILURE_BODY = """表單填寫失敗通知
+
+時間：{now}
+
+以下星期劃假失敗：
+  星期{weekday}
+
+表單資訊：
+  星期{weekday}：{url}
+
+錯誤訊息：
+  {error_msg}
+
+{next_step}
+
+----
+本郵件由表單填寫機器人自動發送（第一次失敗通知）
+"""
+
+SUMMARY_BODY = """{status} 表單填寫執行報告
+
+====================================
+執行結束時間：{end_time}
+總表單數：{total}
+成功數量：{success_count}
+失敗數量：{failure_count}
+====================================
+{reason_section}
+成功的表單：
+{success_list}
+
+失敗的表單：
+{failure_list}
+
+====================================
+
+本郵件由表單填寫機器人自動發送。
+"""
+
+SUMMARY_REASON_SECTION = """
+請假理由說明：
+{reason_lines}
+
+====================================
+"""
+
 
 class EmailService:
     """Email notification service"""
@@ -23,6 +214,24 @@ class EmailService:
         self.smtp_server = SMTP_SERVER
         self.smtp_port = SMTP_PORT
         self.email_enabled = os.environ.get('EMAIL_ENABLED', '1') == '1'
+        self._app_password: Optional[str] = None
+        # Fire-and-forget sends (slow-redirect warnings) still running, awaited by wait_background()
+        self._background_tasks: Set[asyncio.Task] = set()
+    
+    def start_background(self, send: Awaitable[None]) -> None:
+        """Run a send without awaiting it here; it is tracked until it finishes"""
+        task = asyncio.ensure_future(send)
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
+    
+    async def wait_background(self) -> None:
+        """Wait for every background send (call before the summary email and close())"""
+        if self._background_tasks:
+            await asyncio.gather(*self._background_tasks, return_exceptions=True)
+    
+    async def close(self) -> None:
+        """Close the shared SMTP connections (call once at the end of the run)"""
+        await _smtp_pool.close()
     
     def _check_email_enabled(self):
         """Check if email is enabled"""
@@ -31,7 +240,10 @@ class EmailService:
         return True
     
     def _load_app_password(self, file_path: str = MAIL_KEY_FILE) -> str:
-        """Load application password from mail_key.env"""
+        """Load application password from mail_key.env (read once, then cached)"""
+        if self._app_password is not None:
+            return self._app_password
+        
         p = Path(file_path)
         if not p.exists():
             raise FileNotFoundError(f"Cannot find {file_path}, please create this file and fill in app password")
@@ -46,80 +258,70 @@ class EmailService:
         password = password.replace(" ", "")
         
         if len(password) != 16:
-            print(f"警告: 應用程式密碼長度為 {len(password)}, 預期為 16 位")
+            logger.warning("警告: 應用程式密碼長度為 %d, 預期為 16 位", len(password))
         
+        self._app_password = password
         return password
     
-    async def _send_via_smtp(self, subject: str, body: str) -> None:
-        """Send email using Gmail SMTP"""
-        try:
-            import aiosmtplib
-            from email.message import EmailMessage
-        except ImportError:
-            raise ImportError("請先安裝 aiosmtplib：pip install aiosmtplib")
-        
-        app_password = self._load_app_password()
-        
+    def _build_message(self, subject: str, body: str) -> EmailMessage:
+        """Build a plain-text UTF-8 message with the standard headers"""
         message = EmailMessage()
         message["From"] = f"{self.sender_name} <{self.gmail_account}>"
         message["To"] = self.recipient_email
         message["Subject"] = subject
         message.set_content(body, charset="utf-8")
+        return message
+    
+    async def _send_via_smtp(self, subject: str, body: str) -> None:
+        """Send email using Gmail SMTP"""
+        app_password = self._load_app_password()
+        
+        message = self._build_message(subject, body)
         
-        await aiosmtplib.send(
+        await _smtp_pool.send(
             message,
             hostname=self.smtp_server,
             port=self.smtp_port,
             username=self.gmail_account,
             password=app_password,
-            start_tls=True,
         )
     
     async def _send_with_attachment(self, subject: str, body: str, attachment_paths: List[str]) -> None:
         """Send email with attachments"""
-        try:
-            import aiosmtplib
-            from email.mime.image import MIMEImage
-            from email.mime.multipart import MIMEMultipart
-            from email.mime.text import MIMEText
-        except ImportError:
-            raise ImportError("請先安裝 aiosmtplib: pip install aiosmtplib")
-        
         app_password = self._load_app_password()
         
-        message = MIMEMultipart()
-        message["From"] = f"{self.sender_name} <{self.gmail_account}>"
-        message["To"] = self.recipient_email
-        message["Subject"] = subject
-        
-        message.attach(MIMEText(body, "plain", "utf-8"))
+        message = self._build_message(subject, body)
         
         for file_path in attachment_paths:
-            if not file_path or not Path(file_path).exists():
+            if not file_path:
                 continue
             
             try:
-                with open(file_path, "rb") as f:
-                    img_data = f.read()
-                
+                # Read in a worker thread so the event loop (and Playwright) keeps running
                 file_path_obj = Path(file_path)
+                img_data = await asyncio.to_thread(file_path_obj.read_bytes)
                 filename = file_path_obj.name
                 
-                image = MIMEImage(img_data)
-                image.add_header("Content-Disposition", "attachment", filename=filename)
-                message.attach(image)
+                subtype = file_path_obj.suffix.lstrip(".").lower() or "png"
+                message.add_attachment(
+                    img_data,
+                    maintype="image",
+                    subtype="jpeg" if subtype == "jpg" else subtype,
+                    filename=filename,
+                )
                 
-                print(f"[郵件模組] 已附加檔案：{filename}")
+                logger.info("[郵件模組] 已附加檔案：%s", filename)
+            except FileNotFoundError:
+                continue
             except Exception as e:
-                print(f"[郵件模組] 附加檔案失敗 {file_path}：{e}")
+                logger.warning("[郵件模組] 附加檔案失敗 %s：%s", file_path, e)
         
-        await aiosmtplib.send(
+        await _smtp_pool.send(
             message,
             hostname=self.smtp_server,
             port=self.smtp_port,
             username=self.gmail_account,
             password=app_password,
-            start_tls=True,
         )
     
     async def send_warning(self, weekday_name: str) -> None:
@@ -127,35 +329,17 @@ class EmailService:
         if not self._check_email_enabled():
             return
         
-        print(f"[郵件模組] 準備發送警告郵件: 星期{weekday_name}表單超時...")
+        logger.info("[郵件模組] 準備發送警告郵件: 星期%s表單超時...", weekday_name)
         
         now = dt.datetime.now()
         subject = f"警告: 星期{weekday_name}表單提交超時"
-        body = f"""表單填寫警告通知
-
-時間：{now:%Y-%m-%d %H:%M:%S}
-星期：{weekday_name}
-
-警告內容：
-星期{weekday_name}的表單在點擊提交後，10秒內未轉跳到成功頁面。
-程式將繼續等待至20秒，若仍未成功則會標記為失敗。
-
-可能原因：
-1. 網路速度較慢
-2. Google 伺服器回應延遲
-3. 表單設定有誤
-
-程式將繼續嘗試，請留意最終結果通知。
-
-----
-自動發送於表單提交後第10秒
-"""
+        body = WARNING_BODY.format_map({"now": f"{now:%Y-%m-%d %H:%M:%S}", "weekday": weekday_name})
         
         try:
             await self._send_via_smtp(subject, body)
-            print(f"[郵件模組] 警告郵件已發送")
+            logger.info("[郵件模組] 警告郵件已發送")
         except Exception as e:
-            print(f"[郵件模組] 警告郵件發送失敗：{e}")
+            logger.error("[郵件模組] 警告郵件發送失敗：%s", e)
             raise
     
     async def send_reminder(self, weekday_list: List[str], reason_map: dict = None) -> None:
@@ -163,7 +347,7 @@ class EmailService:
         if not self._check_email_enabled():
             return
         
-        print("[郵件模組] 準備發送執行前提醒郵件...")
+        logger.info("[郵件模組] 準備發送執行前提醒郵件...")
         
         now = dt.datetime.now()
         subject = "下午兩點準時劃假"
@@ -177,78 +361,55 @@ class EmailService:
                     reason_lines.append(f"  星期{weekday}：{reason_map[weekday]}")
             
             if reason_lines:
-                reason_section = f"""
-請假理由說明：
-{chr(10).join(reason_lines)}
-"""
+                reason_section = REMINDER_REASON_SECTION.format_map({"reason_lines": "\n".join(reason_lines)})
         
-        body = f"""劃假機器人提醒通知
-
-提醒時間：{now:%Y-%m-%d %H:%M:%S}
-
-本次將於下午兩點準時執行劃假作業。
-
-劃假星期：
-  {weekday_str}
-{reason_section}
-程式將在 5 分鐘後自動執行。
-
-----
-本郵件由表單填寫機器人自動發送
-"""
+        body = REMINDER_BODY.format_map({
+            "now": f"{now:%Y-%m-%d %H:%M:%S}",
+            "weekdays": weekday_str,
+            "reason_section": reason_section,
+        })
         
         try:
             await self._send_via_smtp(subject, body)
-            print(f"[郵件模組] 執行前提醒郵件已發送")
+            logger.info("[郵件模組] 執行前提醒郵件已發送")
         except Exception as e:
-            print(f"[郵件模組] 執行前提醒郵件發送失敗：{e}")
+            logger.error("[郵件模組] 執行前提醒郵件發送失敗：%s", e)
             raise
     
-    async def send_immediate_failure(self, weekday_name: str, url: str, screenshot_path: str = None, error_msg: str = "") -> None:
-        """Send immediate failure notification on first failure"""
+    async def send_immediate_failure(self, weekday_name: str, url: str, screenshot_path: str = None, error_msg: str = "", will_retry: bool = True) -> None:
+        """Send immediate failure notification on first failure (will_retry=False when no second attempt follows)"""
         if not self._check_email_enabled():
             return
         
-        print(f"[郵件模組] 準備發送第一次失敗通知：星期{weekday_name}...")
+        logger.info("[郵件模組] 準備發送第一次失敗通知：星期%s...", weekday_name)
         
         now = dt.datetime.now()
         subject = f"傳送表單失敗 - 星期{weekday_name}"
-        body = f"""表單填寫失敗通知
-
-時間：{now:%Y-%m-%d %H:%M:%S}
-
-以下星期劃假失敗：
-  星期{weekday_name}
-
-表單資訊：
-  星期{weekday_name}：{url}
-
-錯誤訊息：
-  {error_msg}
-
-程式將進行第二次嘗試，請留意最終結果通知。
-
-----
-本郵件由表單填寫機器人自動發送（第一次失敗通知）
-"""
+        body = IMMEDIATE_FAILURE_BODY.format_map({
+            "now": f"{now:%Y-%m-%d %H:%M:%S}",
+            "weekday": weekday_name,
+            "url": url,
+            "error_msg": error_msg,
+            "next_step": "程式將進行第二次嘗試，請留意最終結果通知。" if will_retry else "表單已關閉，程式不會再重試，請留意最終結果通知。",
+        })
         
         try:
             if screenshot_path:
                 await self._send_with_attachment(subject, body, [screenshot_path])
             else:
                 await self._send_via_smtp(subject, body)
-            print(f"[郵件模組] 第一次失敗通知已發送")
+            logger.info("[郵件模組] 第一次失敗通知已發送")
         except Exception as e:
-            print(f"[郵件模組] 第一次失敗通知發送失敗：{e}")
+            logger.error("[郵件模組] 第一次失敗通知發送失敗：%s", e)
             raise
     
     async def send_summary(self, success_list: List[str], failure_list: List[Tuple[str, str, str]], end_time, reason_map: dict = None) -> None:
         """Send summary email after all forms execution completes"""
         if not self._check_email_enabled():
-            print("[郵件模組] 郵件功能已停用，跳過發送總結郵件")
+            logger.info("[郵件模組] 郵件功能已停用，跳過發送總結郵件")
             return
         
-        print("[郵件模組] 準備發送總結郵件...")
+        logger.info("[郵件模組] 準備發送總結郵件...")
         
         total = len(success_list) + len(failure_list)
         
@@ -268,55 +429,51 @@ class EmailService:
                     reason_lines.append(f"  星期{weekday}：{reason_map[weekday]}")
             
             if reason_lines:
-                reason_section = f"""
-請假理由說明：
-{chr(10).join(reason_lines)}
-
-====================================
-"""
-        
-        body = f"""{status} 表單填寫執行報告
-
-====================================
-執行結束時間：{end_time:%Y-%m-%d %H:%M:%S}
-總表單數：{total}
-成功數量：{len(success_list)}
-失敗數量：{len(failure_list)}
-====================================
-{reason_section}
-成功的表單：
-{self._format_success_list(success_list)}
-
-失敗的表單：
-{self._format_failure_list_with_url(failure_list)}
-
-====================================
-
-本郵件由表單填寫機器人自動發送。
-"""
+                reason_section = SUMMARY_REASON_SECTION.format_map({"reason_lines": "\n".join(reason_lines)})
+        
+        body = SUMMARY_BODY.format_map({
+            "status": status,
+            "end_time": f"{end_time:%Y-%m-%d %H:%M:%S}",
+            "total": total,
+            "success_count": len(success_list),
+            "failure_count": len(failure_list),
+            "reason_section": reason_section,
+            "success_list": self._format_success_list(success_list),
+            "failure_list": self._format_failure_list_with_url(failure_list),
+        })
         
         try:
             await self._send_via_smtp(subject, body)
-            print(f"[郵件模組] 總結郵件已發送")
+            logger.info("[郵件模組] 總結郵件已發送")
         except Exception as e:
-            print(f"[郵件模組] 總結郵件發送失敗：{e}")
+            logger.error("[郵件模組] 總結郵件發送失敗：%s", e)
             raise
     
     def _format_success_list(self, success_list: List[str]) -> str:
         """Format success list"""
         if not success_list:
             return "  (None)"
-        return "\n".join(f"  - 星期{name}" for name in success_list)
+        return "\n".join([f"  - 星期{name}" for name in success_list])
     
     def _format_failure_list_with_url(self, failure_list: List[Tuple[str, str, str]]) -> str:
         """Format failure list with URL"""
         if not failure_list:
             return "  （無）"
         
-        result = []
-        for weekday_name, url, error_msg in failure_list:
-            result.append(f"  - 星期{weekday_name}：{url}")
-            result.append(f"    錯誤：{error_msg}")
-        
-        return "\n".join(result)
+        return "\n".join([
+            f"  - 星期{weekday_name}：{url}\n    錯誤：{error_msg}"
+            for weekday_name, url, error_msg in failure_list
+        ])
+
+
+
+# Global email service instance
+_email_service = None
+
 
+def get_email_service() -> EmailService:
+    """Get global email service instance (built on first use)"""
+    global _email_service
+    if _email_service is None:
+        _email_service = EmailService()
+    return _email_service
@@ -2,9 +2,13 @@
 Setup and Configuration Entry Point
 This is the main entry point for the application
 """
+import os
 import sys
 import json
+import argparse
+import tempfile
 from pathlib import Path
+from string import Template
 
 # Check Python version before importing other modules
 if sys.version_info < (3, 9):
@@ -14,6 +18,15 @@ if sys.version_info < (3, 9):
     print("Please upgrade your Python installation")
     sys.exit(1)
 
+# Expected JSON type of each top-level config.json section: (type, name shown to the user)
+CONFIG_SECTION_TYPES = {
+    "user": (dict, "物件"),
+    "email": (dict, "物件"),
+    "dates": (dict, "物件"),
+    "forms_urls": (list, "陣列"),
+    "settings": (dict, "物件"),
+}
+
 
 def check_and_load_config():
     """Check if config.json exists and load it"""
@@ -31,17 +44,28 @@ def check_and_load_config():
         sys.exit(1)
     
     try:
-        with open(config_path, "r", encoding="utf-8") as f:
-            config = json.load(f)
-        return config
+        # json.loads decodes the UTF-8 bytes itself, no text-mode file wrapper needed
+        config = json.loads(config_path.read_bytes())
     except json.JSONDecodeError as e:
         print(f"❌ 錯誤：config.json 格式不正確")
         print(f"詳細錯誤：{e}")
         sys.exit(1)
+    
+    # Fail fast on a wrong structure, before any .get() chain silently falls back to defaults
+    if not isinstance(config, dict):
+        print("❌ 錯誤：config.json 最外層應為物件 {...}")
+        sys.exit(1)
+    
+    for key, (expected_type, type_name) in CONFIG_SECTION_TYPES.items():
+        if key in config and not isinstance(config[key], expected_type):
+            print(f"❌ 錯誤：config.json 的「{key}」應為{type_name}")
+            sys.exit(1)
+    
+    return config
 
 
-def validate_config(config):
-    """Validate config.json content"""
+def validate_config(config, assume_yes: bool = False):
+    """Validate config.json content, assume_yes skips the confirmation prompt"""
     print("=" * 60)
     print("配置資訊確認")
     print("=" * 60)
@@ -94,6 +118,10 @@ def validate_config(config):
     print("\n" + "=" * 60)
     
     # Ask for confirmation
+    if assume_yes:
+        print("\n✓ 已指定 --yes，略過確認")
+        return config
+    
     ans = input("\n以上資訊是否正確？(y/n)：").strip().lower()
     if ans != "y":
         print("\n請修改 config.json 檔案，然後重新執行。")
@@ -103,14 +131,24 @@ def validate_config(config):
     return config
 
 
-def check_mail_key():
-    """Check if mail_key.env exists and handle email functionality"""
+def check_mail_key(mail_key: str = None, assume_yes: bool = False):
+    """
+    Check if mail_key.env exists and handle email functionality
+    mail_key (from --mail-key) is saved without prompting; with assume_yes and no key, email is disabled without prompting
+    """
     mail_key_path = Path("mail_key.env")
     
     if mail_key_path.exists():
         print("\n✓ 偵測到 mail_key.env，郵件功能已啟用")
         return True
     
+    if mail_key:
+        return _save_mail_key(mail_key_path, mail_key)
+    
+    if assume_yes:
+        print("\n✓ 未偵測到 mail_key.env 且未指定 --mail-key，郵件功能已停用")
+        return False
+    
     print("\n" + "=" * 60)
     print("⚠️  未偵測到 mail_key.env")
     print("=" * 60)
@@ -134,7 +172,11 @@ def check_mail_key():
         print("\n✗ 未輸入密碼，郵件功能已停用")
         return False
     
-    # Write to mail_key.env
+    return _save_mail_key(mail_key_path, key)
+
+
+def _save_mail_key(mail_key_path: Path, key: str) -> bool:
+    """Write the app password to mail_key.env, returns whether email is enabled"""
     try:
         with open(mail_key_path, "w", encoding="utf-8") as f:
             f.write(f"KEY={key}\n")
@@ -146,29 +188,25 @@ def check_mail_key():
         return False
 
 
-def write_config_to_settings_py(config):
-    """Write config.json data to config/settings.py"""
-    # Update config/settings.py
-    user = config.get('user', {})
-    email = config.get('email', {})
-    settings = config.get('settings', {})
-    
-    settings_content = f'''"""
+# Skeleton of the generated config/settings.py, $-placeholders are filled from config.json
+SETTINGS_TEMPLATE = Template('''"""
 Application Configuration Settings
 All configurable parameters are defined here
 """
 
 # ==== User Configuration ====
-NAME = "{user.get('name', '您的姓名')}"
+NAME = "$name"
 TIMEZONE = "Asia/Taipei"
 
 # ==== File Paths ====
 SCREENSHOT_DIR = "fail_img"
+SCREENSHOT_FORMAT = "jpeg"  # "jpeg" (small, fast to encode) or "png" (lossless, for rendering issues)
 
 # ==== Browser Settings ====
-HEADLESS = {str(settings.get('headless', False))}
+HEADLESS = $headless
 NAV_TIMEOUT_MS = 40_000
 ACTION_TIMEOUT_MS = 20_000
+MAX_CONCURRENT_FORMS = 3  # Immediate mode: forms processed at the same time
 
 # ==== Retry Settings ====
 MAX_RETRIES_PER_FORM = 2  # Total attempts: 2 times (first attempt + 1 retry)
@@ -179,19 +217,22 @@ SUBMIT_WARNING_TIMEOUT_SEC = 10  # Send warning email if no redirect within 10 s
 SUBMIT_KILL_TIMEOUT_SEC = 20     # Mark as failure if no redirect within 20 seconds
 
 # ==== Reason Validation ====
-MIN_REASON_LENGTH = {settings.get('min_reason_length', 15)}  # Minimum character count for weekend reason (excluding spaces)
+MIN_REASON_LENGTH = $min_reason_length  # Minimum character count for weekend reason (excluding spaces)
 
 # ==== Weekday Mappings ====
 # Chinese weekday to index mapping (Monday=0, ..., Sunday=6)
-WEEKDAY_MAP = {{
+WEEKDAY_MAP = {
     "一": 0, "二": 1, "三": 2, "四": 3, "五": 4, "六": 5, "日": 6, "天": 6
-}}
+}
+
+# Weekday index to Chinese name mapping (Monday=0, ..., Sunday=6)
+WEEKDAY_NAMES = ("一", "二", "三", "四", "五", "六", "日")
 
 # Weekday index to English name mapping (capitalized)
-WEEKDAY_EN = {{
+WEEKDAY_EN = {
     0: "Monday", 1: "Tuesday", 2: "Wednesday", 3: "Thursday",
     4: "Friday", 5: "Saturday", 6: "Sunday"
-}}
+}
 
 # ==== Form Field Keywords ====
 VACATION_KEYWORDS = [
@@ -203,19 +244,63 @@ SUBMIT_BTN_PATTERNS = [
 ]
 
 # ==== Email Configuration ====
-GMAIL_ACCOUNT = "{email.get('gmail_account', 'your_email@gmail.com')}"
-RECIPIENT_EMAIL = "{email.get('recipient_email', 'recipient@example.com')}"
-SENDER_NAME = "{email.get('sender_name', '表單填寫機器人')}"
+GMAIL_ACCOUNT = "$gmail_account"
+RECIPIENT_EMAIL = "$recipient_email"
+SENDER_NAME = "$sender_name"
 MAIL_KEY_FILE = "mail_key.env"
 SMTP_SERVER = "smtp.gmail.com"
-SMTP_PORT = 587
-'''
+SMTP_PORT = 465  # Implicit TLS (one round trip fewer than STARTTLS on 587)
+''')
+
+
+def write_config_to_settings_py(config):
+    """Write config.json data to config/settings.py"""
+    # Update config/settings.py
+    user = config.get('user', {})
+    email = config.get('email', {})
+    settings = config.get('settings', {})
+    
+    settings_content = SETTINGS_TEMPLATE.substitute(
+        name=user.get('name', '您的姓名'),
+        headless=str(settings.get('headless', False)),
+        min_reason_length=settings.get('min_reason_length', 15),
+        gmail_account=email.get('gmail_account', 'your_email@gmail.com'),
+        recipient_email=email.get('recipient_email', 'recipient@example.com'),
+        sender_name=email.get('sender_name', '表單填寫機器人'),
+    )
     
-    Path("config/settings.py").write_text(settings_content, encoding="utf-8")
+    # Write a sibling temp file and swap it in, so an interrupted write never leaves a broken settings.py
+    fd, tmp_path = tempfile.mkstemp(dir="config", prefix=".settings.", suffix=".py")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(settings_content)
+        # mkstemp creates the file owner-only; keep the usual world-readable mode of a .py file
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, Path("config") / "settings.py")
+    except BaseException:
+        Path(tmp_path).unlink(missing_ok=True)
+        raise
+
+
+def parse_args(argv=None):
+    """Parse command line options that answer the setup prompts up front"""
+    parser = argparse.ArgumentParser(description="Google Forms Auto-Fill Bot")
+    parser.add_argument("--yes", action="store_true", help="略過 config.json 確認提示")
+    parser.add_argument("--mail-key", help="Gmail 應用程式密碼（未有 mail_key.env 時寫入並啟用郵件）")
+    args = parser.parse_args(argv)
+    
+    if args.mail_key is not None:
+        args.mail_key = args.mail_key.strip()
+        if not args.mail_key:
+            parser.error("--mail-key 不可為空白")
+    
+    return args
 
 
 def main():
     """Main setup entry point"""
+    args = parse_args()
+    
     print("=" * 60)
     print("Google Forms Auto-Fill Bot")
     print("=" * 60)
@@ -226,11 +311,11 @@ def main():
     
     # Step 2: Validate and confirm config
     print("\n[步驟 2/3] 驗證配置資訊...")
-    config = validate_config(config)
+    config = validate_config(config, assume_yes=args.yes)
     
     # Step 3: Check mail_key.env
     print("\n[步驟 3/3] 檢查郵件設定...")
-    email_enabled = check_mail_key()
+    email_enabled = check_mail_key(mail_key=args.mail_key, assume_yes=args.yes)
     
     # Write config to settings.py
     print("\n正在生成 config/settings.py...")
@@ -238,7 +323,6 @@ def main():
     print("✓ config/settings.py 已生成")
     
     # Set global email flag
-    import os
     os.environ['EMAIL_ENABLED'] = '1' if email_enabled else '0'
     
     # Import and run main program
@@ -247,9 +331,11 @@ def main():
     print("=" * 60)
     
     # Import main after config is ready
-    from main import main as run_main
+    from main import main as run_main, install_uvloop, configure_logging
     import asyncio
     
+    configure_logging()
+    install_uvloop()
     asyncio.run(run_main())
 
 
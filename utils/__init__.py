@@ -1,5 +1,5 @@
 # Utilities package
 from .config_loader import ConfigLoader, get_config_loader
-from .screenshot import ensure_screenshot_dir, get_screenshot_filename, take_screenshot
-from .validators import check_form_closed
+from .screenshot import ensure_screenshot_dir, get_screenshot_filename, get_screenshot_path, take_screenshot
+from .validators import check_form_closed, FormClosedError, FormSubmitError
 
@@ -8,6 +8,9 @@ from typing import List, Dict, Tuple
 
 from config.settings import MIN_REASON_LENGTH
 
+# Whitespace (ASCII and full-width) not counted towards reason length
+_WHITESPACE_TABLE = str.maketrans("", "", " \u3000\t\n\r")
+
 
 class ConfigLoader:
     """Load and validate configuration from config.json"""
@@ -15,37 +18,49 @@ class ConfigLoader:
     def __init__(self, config_path: str = "config.json"):
         self.config_path = Path(config_path)
         self.config = None
+        # Flat views of the config, filled in by load()
+        self._weekdays: List[str] = []
+        self._reasons: Dict[str, str] = {}
+        self._urls: List[str] = []
     
     def load(self) -> dict:
         """Load config.json"""
         if not self.config_path.exists():
             raise FileNotFoundError(f"找不到 {self.config_path}")
         
-        with open(self.config_path, "r", encoding="utf-8") as f:
-            self.config = json.load(f)
+        # json.loads decodes the UTF-8 bytes itself, no text-mode file wrapper needed
+        self.config = json.loads(self.config_path.read_bytes())
+        
+        dates = self.config.get('dates', {})
+        self._weekdays = dates.get('weekdays', [])
+        self._reasons = dates.get('reasons', {})
+        self._urls = self.config.get('forms_urls', [])
         
         return self.config
     
+    def _get_config(self) -> dict:
+        """Return parsed config, reading config.json only on first use"""
+        if self.config is None:
+            self.load()
+        return self.config
+    
     def get_weekdays(self) -> List[str]:
         """Get requested weekdays from config"""
-        if not self.config:
-            self.load()
+        self._get_config()
         
-        return self.config.get('dates', {}).get('weekdays', [])
+        return self._weekdays
     
     def get_reasons(self) -> Dict[str, str]:
         """Get reason mapping from config"""
-        if not self.config:
-            self.load()
+        self._get_config()
         
-        return self.config.get('dates', {}).get('reasons', {})
+        return self._reasons
     
     def get_form_urls(self) -> List[str]:
         """Get form URLs from config"""
-        if not self.config:
-            self.load()
+        self._get_config()
         
-        urls = self.config.get('forms_urls', [])
+        urls = self._urls
         if len(urls) != 7:
             raise ValueError(f"forms_urls 應包含 7 個 URL，對應星期一到星期日。目前有 {len(urls)} 個")
         
@@ -68,7 +83,7 @@ class ConfigLoader:
                     sys.exit(1)
                 
                 reason = reasons[weekday]
-                reason_length = len(reason.replace(" ", "").replace("　", ""))
+                reason_length = len(reason.translate(_WHITESPACE_TABLE))
                 
                 if reason_length < MIN_REASON_LENGTH:
                     print(f"❌ 錯誤：星期{weekday}的請假原因字數不足")
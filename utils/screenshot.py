@@ -1,10 +1,15 @@
 """
 Screenshot utilities for capturing form errors
 """
+import asyncio
 import datetime as dt
+import logging
+from functools import lru_cache
 from pathlib import Path
 
-from config.settings import SCREENSHOT_DIR, WEEKDAY_EN, TIMEZONE
+from config.settings import SCREENSHOT_DIR, SCREENSHOT_FORMAT, WEEKDAY_EN, TIMEZONE
+
+logger = logging.getLogger(__name__)
 
 # Timezone utilities
 try:
@@ -14,8 +19,9 @@ except Exception:
     ZoneInfoNotFoundError = Exception
 
 
+@lru_cache(maxsize=1)
 def get_tz():
-    """Get timezone, prefer ZoneInfo('Asia/Taipei'), fallback to UTC+8 if tzdata is missing"""
+    """Get timezone (resolved once), prefer ZoneInfo('Asia/Taipei'), fallback to UTC+8 if tzdata is missing"""
     if ZoneInfo is None:
         return dt.timezone(dt.timedelta(hours=8))
     try:
@@ -24,34 +30,60 @@ def get_tz():
         return dt.timezone(dt.timedelta(hours=8))
 
 
+# Resolve (and cache) the timezone at import, so the first failure screenshot does not read tzdata
+get_tz()
+
+
+# Screenshot directory as a Path, built once
+_SCREENSHOT_DIR_PATH = Path(SCREENSHOT_DIR)
+
+# File suffix and Playwright screenshot options for the configured format
+_SCREENSHOT_SUFFIX = "png" if SCREENSHOT_FORMAT == "png" else "jpg"
+_SCREENSHOT_OPTIONS = {"type": "png"} if SCREENSHOT_FORMAT == "png" else {"type": "jpeg", "quality": 70}
+
+# "-Weekday.ext" filename tail per weekday index, fixed for the process
+_FILENAME_SUFFIXES = tuple(f"-{WEEKDAY_EN[idx]}.{_SCREENSHOT_SUFFIX}" for idx in range(7))
+
+# Set once the screenshot directory is known to exist
+_screenshot_dir_ready = False
+
+
 def ensure_screenshot_dir():
-    """Ensure screenshot directory exists"""
-    Path(SCREENSHOT_DIR).mkdir(exist_ok=True)
+    """Ensure screenshot directory exists, only touching the filesystem on the first call"""
+    global _screenshot_dir_ready
+    if not _screenshot_dir_ready:
+        _SCREENSHOT_DIR_PATH.mkdir(parents=True, exist_ok=True)
+        _screenshot_dir_ready = True
 
 
 def get_screenshot_filename(weekday_idx: int) -> str:
     """
     Generate screenshot filename
-    Format: YYYY-MM-DD-Weekday.png
-    Example: 2025-10-02-Thursday.png
+    Format: YYYY-MM-DD-Weekday.jpg (.png when SCREENSHOT_FORMAT = "png")
+    Example: 2025-10-02-Thursday.jpg
     """
-    tz = get_tz()
-    now = dt.datetime.now(tz)
-    weekday_en = WEEKDAY_EN[weekday_idx]
-    return f"{now:%Y-%m-%d}-{weekday_en}.png"
+    return f"{dt.datetime.now(get_tz()):%Y-%m-%d}" + _FILENAME_SUFFIXES[weekday_idx]
+
+
+def get_screenshot_path(weekday_idx: int) -> Path:
+    """Full path of today's screenshot for the given weekday"""
+    return _SCREENSHOT_DIR_PATH / get_screenshot_filename(weekday_idx)
 
 
-async def take_screenshot(page, weekday_idx: int) -> str:
+async def take_screenshot(page, weekday_idx: int, full_page: bool = False) -> str:
     """
     Take screenshot and save to fail_img directory
+    Captures only the viewport unless full_page=True (forces a full-height relayout)
     Returns the full path of the screenshot
     """
     ensure_screenshot_dir()
-    filename = get_screenshot_filename(weekday_idx)
-    filepath = Path(SCREENSHOT_DIR) / filename
+    filepath = get_screenshot_path(weekday_idx)
     
-    await page.screenshot(path=str(filepath), full_page=True)
-    print(f"已截圖: {filepath}")
+    # Viewport JPEG (default) is enough for diagnostics and far cheaper than a full-page PNG
+    data = await page.screenshot(full_page=full_page, **_SCREENSHOT_OPTIONS)
+    # Write in a worker thread so other forms keep running; awaited because callers attach the file
+    await asyncio.to_thread(filepath.write_bytes, data)
+    logger.info("已截圖: %s", filepath)
     
     return str(filepath)
 
@@ -1,6 +1,44 @@
 """
 Form validation utilities
 """
+import re
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Texts Google Forms shows when a form no longer accepts responses, most likely first
+# ("已停止接受回應" is covered by "停止接受回應", so it is not listed separately)
+CLOSED_PATTERNS = (
+    "劃假已滿，如有相關問題可聯繫班次主管與排班組。",
+    "不接受回應",
+    "停止接受回應",
+    "不再接受回應",
+    "不接受填寫",
+    "已關閉",
+)
+
+# All patterns as one alternation, so the page is queried once instead of once per pattern
+CLOSED_PATTERN_RE = re.compile("|".join(re.escape(pattern) for pattern in CLOSED_PATTERNS))
+
+# One in-page scan of the rendered text, returns the matched pattern or null
+FIND_CLOSED_TEXT_JS = """
+(source) => {
+    const match = new RegExp(source).exec(document.body ? document.body.innerText : "");
+    return match ? match[0] : null;
+}
+"""
+
+
+class FormClosedError(RuntimeError):
+    """Raised when a form no longer accepts responses, retrying cannot help"""
+
+
+class FormSubmitError(RuntimeError):
+    """Raised when one submit attempt fails, screenshot_path is the file that attempt wrote (or None)"""
+
+    def __init__(self, message: str, screenshot_path: str = None):
+        super().__init__(message)
+        self.screenshot_path = screenshot_path
 
 
 async def check_form_closed(page) -> bool:
@@ -8,28 +46,18 @@ async def check_form_closed(page) -> bool:
     Check if form is closed (displays "not accepting responses")
     Returns True if form is closed
     """
+    # Imported here so importing utils does not load Playwright before the prompts
+    from playwright.async_api import Error as PlaywrightError
+    
     try:
-        # Try to find closed form indicators
-        closed_patterns = [
-            "不接受回應",
-            "不再接受回應",
-            "已停止接受回應",
-            "停止接受回應",
-            "不接受填寫",
-            "已關閉",
-            "劃假已滿，如有相關問題可聯繫班次主管與排班組。"
-        ]
-        
-        for pattern in closed_patterns:
-            try:
-                element = page.get_by_text(pattern)
-                if await element.count() > 0:
-                    print(f"偵測到表單已關閉: 找到「{pattern}」字樣")
-                    return True
-            except Exception:
-                continue
-        
+        # Single round trip: the browser tests the whole page text against the joined pattern
+        matched = await page.evaluate(FIND_CLOSED_TEXT_JS, CLOSED_PATTERN_RE.pattern)
+    except PlaywrightError:
+        # Page closed or navigating: closure cannot be confirmed
         return False
-    except Exception:
+    
+    if not matched:
         return False
-
+    
+    logger.info("偵測到表單已關閉: 找到「%s」字樣", matched)
+    return True